@@ -1,14 +1,12 @@
-import json
 import os
+import pickle
 import threading
 import webbrowser
 import uuid
-from io import BytesIO
 from importlib import reload
+from pathlib import Path
 from typing import Any, Dict, List
 
-from pypdf import PdfReader
-
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
 
 import backend_logic as bl
@@ -16,52 +14,119 @@ import backend_logic as bl
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key-noesis-2024")
 
-# In-memory session store (use Redis/DB in production)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+REDIS_URL = os.getenv("REDIS_URL", "")
+
+# Sessions live in Redis when REDIS_URL is set so several workers can share them;
+# otherwise fall back to an in-memory store for local development.
+redis_client = None
+if REDIS_URL:
+    import redis
+
+    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=False)
+
 sessions_store: Dict[str, Dict[str, Any]] = {}
 
+_BL_PATH = Path(bl.__file__)
+_bl_mtime = _BL_PATH.stat().st_mtime_ns
 
-def get_generator() -> Any:
-    return reload(bl).generate_checkpoints
 
+def _session_key(session_id: str, suffix: str = "") -> str:
+    return f"noesis:sess:{session_id}{suffix}"
+
+
+def _save_session(session_id: str, payload: Dict[str, Any]) -> None:
+    if redis_client is None:
+        sessions_store[session_id] = {**payload, "code_submissions": {}, "completed": set()}
+        return
+    redis_client.setex(_session_key(session_id), SESSION_TTL_SECONDS, pickle.dumps(payload))
+
+
+def _load_session(session_id: str) -> Dict[str, Any] | None:
+    if not session_id:
+        return None
+    if redis_client is None:
+        return sessions_store.get(session_id)
+
+    key = _session_key(session_id)
+    pipe = redis_client.pipeline()
+    pipe.get(key)
+    pipe.hgetall(_session_key(session_id, ":code"))
+    pipe.smembers(_session_key(session_id, ":completed"))
+    for name in (key, _session_key(session_id, ":code"), _session_key(session_id, ":completed")):
+        pipe.expire(name, SESSION_TTL_SECONDS)
+    blob, code_submissions, completed = pipe.execute()[:3]
+    if blob is None:
+        return None
 
-def _read_uploaded_context(upload) -> str:
+    sess = pickle.loads(blob)
+    sess["code_submissions"] = {
+        cp_id.decode("utf-8"): code.decode("utf-8") for cp_id, code in code_submissions.items()
+    }
+    sess["completed"] = {int(cp_id) for cp_id in completed}
+    return sess
+
+
+def _store_code_submission(session_id: str, checkpoint_id: int, code: str) -> None:
+    if redis_client is None:
+        sessions_store[session_id].setdefault("code_submissions", {})[str(checkpoint_id)] = code
+        return
+    key = _session_key(session_id, ":code")
+    pipe = redis_client.pipeline()
+    pipe.hset(key, str(checkpoint_id), code)
+    pipe.expire(key, SESSION_TTL_SECONDS)
+    pipe.execute()
+
+
+def _mark_completed(session_id: str, checkpoint_id: int) -> None:
+    if redis_client is None:
+        sessions_store[session_id].setdefault("completed", set()).add(checkpoint_id)
+        return
+    key = _session_key(session_id, ":completed")
+    pipe = redis_client.pipeline()
+    pipe.sadd(key, checkpoint_id)
+    pipe.expire(key, SESSION_TTL_SECONDS)
+    pipe.execute()
+
+
+def get_generator() -> Any:
+    # Only hot-reload backend logic in debug mode and when its source changed; otherwise reuse the
+    # imported module so its caches stay warm.
+    global _bl_mtime
+    if app.debug:
+        mtime = _BL_PATH.stat().st_mtime_ns
+        if mtime != _bl_mtime:
+            reload(bl)
+            _bl_mtime = mtime
+    return bl.generate_checkpoints
+
+
+def _read_uploaded_context(upload, max_chars: int = bl.MAX_CONTEXT_CHARS) -> str:
     if not upload or not getattr(upload, "filename", ""):
         return ""
 
-    raw = upload.read()
-    if not raw:
-        return ""
+    # Parse straight off the upload's spooled file instead of copying it into bytes first.
+    stream = upload.stream
+    stream.seek(0)
 
     filename = upload.filename.lower()
     if filename.endswith(".pdf"):
         try:
-            reader = PdfReader(BytesIO(raw))
-            pages = []
-            for page in reader.pages:
-                text = page.extract_text() or ""
-                if text.strip():
-                    pages.append(text)
-            if pages:
-                return "\n".join(pages)
+            text = bl.extract_pdf_text(stream, max_chars)
+            if text:
+                return text
         except Exception:
             pass
+        stream.seek(0)
 
     if filename.endswith(".ipynb"):
         try:
-            payload = json.loads(raw)
-            cells = payload.get("cells", [])
-            parts = []
-            for cell in cells:
-                source = cell.get("source", [])
-                if isinstance(source, list):
-                    parts.append("".join(source))
-                elif isinstance(source, str):
-                    parts.append(source)
-            return "\n".join(parts)
+            return bl.extract_notebook_text(stream, max_chars)
         except Exception:
-            return raw.decode("utf-8", errors="ignore")
+            stream.seek(0)
 
-    return raw.decode("utf-8", errors="ignore")
+    # At most 4 UTF-8 bytes per character, so this is always enough for max_chars of text.
+    return stream.read(max_chars * 4).decode("utf-8", errors="ignore")
 
 
 def _open_browser(url: str) -> None:
@@ -110,14 +175,12 @@ def generate():
 
     # Create session
     session_id = str(uuid.uuid4())
-    sessions_store[session_id] = {
+    _save_session(session_id, {
         "problem": problem,
         "checkpoints": checkpoints,
         "retrieval_chunks": retrieval_chunks,
         "retrieved_context": retrieved_context,
-        "code_submissions": {},
-        "completed": set(),
-    }
+    })
 
     if error:
         return render_template(
@@ -134,7 +197,7 @@ def generate():
 
 @app.route("/checkpoints/<session_id>", methods=["GET"])
 def view_checkpoints(session_id: str):
-    sess = sessions_store.get(session_id)
+    sess = _load_session(session_id)
     if not sess:
         flash("Session not found. Please start a new learning path.")
         return redirect(url_for("index"))
@@ -153,7 +216,7 @@ def view_checkpoints(session_id: str):
 
 @app.route("/editor/<session_id>/<int:checkpoint_id>", methods=["GET"])
 def editor(session_id: str, checkpoint_id: int):
-    sess = sessions_store.get(session_id)
+    sess = _load_session(session_id)
     if not sess:
         flash("Session not found. Please start a new learning path.")
         return redirect(url_for("index"))
@@ -183,7 +246,7 @@ def validate():
     checkpoint_id = data.get("checkpoint_id")
     code = data.get("code", "")
 
-    sess = sessions_store.get(session_id)
+    sess = _load_session(session_id)
     if not sess:
         return jsonify({"pass": False, "message": "Session not found."})
 
@@ -192,9 +255,7 @@ def validate():
         return jsonify({"pass": False, "message": "Invalid checkpoint."})
 
     # Store the code submission
-    if "code_submissions" not in sess:
-        sess["code_submissions"] = {}
-    sess["code_submissions"][str(checkpoint_id)] = code
+    _store_code_submission(session_id, checkpoint_id, code)
 
     # Import and run validator
     try:
@@ -203,9 +264,7 @@ def validate():
         result = validator.validate_code(code, checkpoint)
         
         if result.get("pass"):
-            if "completed" not in sess:
-                sess["completed"] = set()
-            sess["completed"].add(checkpoint_id)
+            _mark_completed(session_id, checkpoint_id)
         
         return jsonify(result)
     except Exception as e:
@@ -1,24 +1,73 @@
 """Checkpoint generation and validation logic using Gemini with backend-driven RAG."""
 
+import hashlib
 import json
-import math
 import os
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
+import diskcache
 import google.generativeai as genai
+import ijson
+import numpy as np
+import orjson
+
+try:
+    import faiss
+except ImportError:  # Optional: without faiss, large corpora use the exact NumPy scan.
+    faiss = None
 
 DEFAULT_MODEL = "gemini-2.5-flash"
+GENERATION_CONFIG = {"temperature": 0.2}
 EMBED_MODEL = "models/text-embedding-004"
 CHUNK_SIZE = 1200
 CHUNK_OVERLAP = 150
 RETRIEVAL_TOP_K = 4
+EMBED_BATCH_SIZE = 100
 MAX_CONTEXT_CHARS = 20000
 CONTEXT_STORE_PATH = Path(os.getenv("CONTEXT_STORE_PATH", "data/context_store.json"))
+CONTEXT_EMBEDDINGS_PATH = Path(
+    os.getenv("CONTEXT_EMBEDDINGS_PATH", str(CONTEXT_STORE_PATH.with_suffix(".embeddings.npy")))
+)
+CONTEXT_INDEX_PATH = CONTEXT_EMBEDDINGS_PATH.with_suffix(".hnsw")
 CONTEXT_SOURCE_DIR = Path(os.getenv("CONTEXT_SOURCE_DIR", "data/context_sources"))
 REFRESH_CONTEXT_ON_START = os.getenv("REFRESH_CONTEXT_ON_START", "false").lower() == "true"
 ALLOWED_SOURCE_SUFFIXES = {".txt", ".md", ".ipynb", ".json", ".pdf"}
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "1000"))
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none").lower()
+QUANTIZED_MIN_RECALL = float(os.getenv("QUANTIZED_MIN_RECALL", "0.9"))
+AD_HOC_CACHE_SIZE = int(os.getenv("AD_HOC_CACHE_SIZE", "32"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", ".noesis_cache")
+RESPONSE_CACHE_SIZE_LIMIT = int(os.getenv("RESPONSE_CACHE_SIZE_LIMIT", str(2**30)))
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+# Shared pool for blocking Gemini calls that can overlap within a request.
+_IO_POOL = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="noesis-io")
+
+# On-disk LRU cache of Gemini embeddings and generations keyed on content hash; empty RESPONSE_CACHE_DIR disables it.
+_CACHE = (
+    diskcache.Cache(RESPONSE_CACHE_DIR, size_limit=RESPONSE_CACHE_SIZE_LIMIT, eviction_policy="least-recently-used")
+    if RESPONSE_CACHE_DIR
+    else None
+)
+
+# Recently seen ad-hoc reference texts (keyed by content hash) mapped to their embedded corpus, LRU-bounded.
+_AD_HOC_LOCK = threading.Lock()
+_AD_HOC_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Gemini client state is configured once per API key and models are reused, so HTTP connections stay warm.
+_GENAI_LOCK = threading.Lock()
+_CONFIGURED_KEY: Optional[str] = None
+_MODELS: Dict[str, Any] = {}
+
+# Parsed context store, reused across requests until the file on disk changes.
+_STORE_CACHE: Dict[str, Any] = {"mtime": None, "matrix": None, "index": None, "texts": [], "sources": []}
 
 REQUIRED_FIELDS = {
     "title": "Untitled checkpoint",
@@ -34,6 +83,35 @@ REQUIRED_FIELDS = {
 }
 
 
+CHECKPOINT_SCHEMA = {
+    "title": "Short name of the checkpoint (<= 8 words).",
+    "objective": "Student-facing goal for this step.",
+    "concept": "Key concept(s) applied here.",
+    "function_signature": "Python function signature to implement.",
+    "rules": "List of hard constraints.",
+    "expected_output": "Describe the expected behavior/output.",
+    "hints": "List of helpful hints (<= 3).",
+    "test_inputs": "Example inputs to try.",
+    "expected_outputs": "Outputs aligned to test_inputs.",
+    "validation_type": "One of: structure, correctness, integration, custom.",
+}
+
+# Static parts of the generation prompt, serialized once at import time.
+_PROMPT_PREAMBLE = (
+    "You are an instructional designer generating programming checkpoints.\n"
+    "Return ONLY valid JSON (no prose) representing a list of checkpoint objects.\n"
+    f"Each checkpoint must follow this JSON schema: {json.dumps(CHECKPOINT_SCHEMA, indent=2)}\n"
+)
+_PROMPT_RULES = (
+    "Rules:\n"
+    "- 3 to 6 checkpoints total.\n"
+    "- Keep titles concise.\n"
+    "- Provide actionable rules and hints.\n"
+    "- Prefer Pythonic, beginner-friendly guidance.\n"
+    "- If reference context exists, align objectives, concepts, and tests to it.\n"
+)
+
+
 def _get_api_key(api_key: Optional[str]) -> str:
     key = api_key or os.getenv("GEMINI_API_KEY") or ""
     if not key:
@@ -43,9 +121,72 @@ def _get_api_key(api_key: Optional[str]) -> str:
 
 def _ensure_store_dir() -> None:
     CONTEXT_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    CONTEXT_EMBEDDINGS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    CONTEXT_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
-def _read_local_file_text(path: Path) -> str:
+def _join_pages(page_texts: Iterable[str], max_chars: int) -> str:
+    pages: List[str] = []
+    total = 0
+    for text in page_texts:
+        if not text or not text.strip():
+            continue
+        pages.append(text)
+        total += len(text) + 1
+        # Callers only keep max_chars of context, so stop extracting once we have enough.
+        if total >= max_chars:
+            break
+    return "\n".join(pages)
+
+
+def _pdfium_page_texts(pdf: Any) -> Iterable[str]:
+    for idx in range(len(pdf)):
+        page = pdf[idx]
+        textpage = page.get_textpage()
+        try:
+            yield textpage.get_text_bounded()
+        finally:
+            textpage.close()
+            page.close()
+
+
+def extract_pdf_text(source: Any, max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """Extract text from a PDF path or bytes, stopping after roughly max_chars characters."""
+    try:
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(source)
+        try:
+            return _join_pages(_pdfium_page_texts(pdf), max_chars)
+        finally:
+            pdf.close()
+    except Exception:
+        # pdfium is much faster, but keep pypdf for files it cannot open (some encrypted/malformed PDFs).
+        from pypdf import PdfReader
+        if hasattr(source, "seek"):
+            source.seek(0)
+        reader = PdfReader(BytesIO(source) if isinstance(source, bytes) else source)
+        return _join_pages((page.extract_text() or "" for page in reader.pages), max_chars)
+
+
+def extract_notebook_text(source: Any, max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """Stream cell sources out of a .ipynb file object without materializing cell outputs."""
+    parts: List[str] = []
+    total = 0
+    for cell_source in ijson.items(source, "cells.item.source"):
+        if isinstance(cell_source, list):
+            text = "".join(cell_source)
+        elif isinstance(cell_source, str):
+            text = cell_source
+        else:
+            continue
+        parts.append(text)
+        total += len(text) + 1
+        if total >= max_chars:
+            break
+    return "\n".join(parts)
+
+
+def _read_local_file_text(path: Path, max_chars: int = MAX_CONTEXT_CHARS) -> str:
     raw_bytes = path.read_bytes()
     if not raw_bytes:
         return ""
@@ -53,30 +194,15 @@ def _read_local_file_text(path: Path) -> str:
     suffix = path.suffix.lower()
     if suffix == ".pdf":
         try:
-            from pypdf import PdfReader
-            reader = PdfReader(path)
-            pages = []
-            for page in reader.pages:
-                text = page.extract_text() or ""
-                if text.strip():
-                    pages.append(text)
-            if pages:
-                return "\n".join(pages)
+            text = extract_pdf_text(path, max_chars)
+            if text:
+                return text
         except Exception:
             return raw_bytes.decode("utf-8", errors="ignore")
 
     if suffix == ".ipynb":
         try:
-            payload = json.loads(raw_bytes)
-            cells = payload.get("cells", [])
-            parts = []
-            for cell in cells:
-                source = cell.get("source", [])
-                if isinstance(source, list):
-                    parts.append("".join(source))
-                elif isinstance(source, str):
-                    parts.append(source)
-            return "\n".join(parts)
+            return extract_notebook_text(BytesIO(raw_bytes), max_chars)
         except Exception:
             return raw_bytes.decode("utf-8", errors="ignore")
 
@@ -137,53 +263,268 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     if not cleaned:
         return []
 
-    # Simple character-based chunking with overlap to preserve context between segments.
-    chunks: List[str] = []
-    cursor = 0
-    while cursor < len(cleaned):
-        end = min(len(cleaned), cursor + chunk_size)
-        chunks.append(cleaned[cursor:end])
-        cursor = end - overlap if end - overlap > cursor else end
-    return chunks
+    if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+        raise ValueError("chunk_size must be positive and overlap must be in [0, chunk_size).")
+
+    # Character-based chunking with overlap; every window start is computed up front, and windows that
+    # would only repeat the tail of the previous chunk are dropped.
+    length = len(cleaned)
+    starts = np.arange(0, max(length - overlap, 1), chunk_size - overlap)
+    ends = np.minimum(starts + chunk_size, length)
+    return [cleaned[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+def _cache_key(*parts: str) -> str:
+    return hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=16).hexdigest()
 
 
-def cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
-    if not a or not b or len(a) != len(b):
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = math.sqrt(sum(x * x for x in a))
-    norm_b = math.sqrt(sum(y * y for y in b))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+def _cache_get(key: str) -> Any:
+    return _CACHE.get(key) if _CACHE is not None else None
+
+
+def _cache_set(key: str, value: Any) -> None:
+    if _CACHE is not None:
+        _CACHE.set(key, value)
+
+
+def _ensure_configured(api_key: str) -> None:
+    global _CONFIGURED_KEY
+    if _CONFIGURED_KEY == api_key:
+        return
+    with _GENAI_LOCK:
+        if _CONFIGURED_KEY != api_key:
+            genai.configure(api_key=api_key)
+            # Models bind the client that was current when first used, so drop them on a key change.
+            _MODELS.clear()
+            _CONFIGURED_KEY = api_key
+
+
+def _get_model(model_name: str) -> Any:
+    model = _MODELS.get(model_name)
+    if model is None:
+        with _GENAI_LOCK:
+            model = _MODELS.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name, generation_config=GENERATION_CONFIG)
+                _MODELS[model_name] = model
+    return model
 
 
 def embed_text(content: str, api_key: str, task_type: str) -> List[float]:
-    genai.configure(api_key=api_key)
+    cache_key = _cache_key("embed", EMBED_MODEL, task_type, content)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    _ensure_configured(api_key)
     response = genai.embed_content(model=EMBED_MODEL, content=content, task_type=task_type)
     embedding = response.get("embedding") if isinstance(response, dict) else getattr(response, "embedding", None)
     if embedding is None:
         raise RuntimeError("Failed to obtain embedding from Gemini.")
+    _cache_set(cache_key, embedding)
     return embedding
 
 
-def _load_context_store() -> List[Dict[str, Any]]:
+def embed_texts(contents: List[str], api_key: str, task_type: str) -> List[List[float]]:
+    # Serve repeated chunks from the cache and embed the rest in batches instead of one request per chunk.
+    cache_keys = [_cache_key("embed", EMBED_MODEL, task_type, content) for content in contents]
+    embeddings: List[Optional[List[float]]] = [_cache_get(cache_key) for cache_key in cache_keys]
+    missing = [idx for idx, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        return embeddings
+
+    _ensure_configured(api_key)
+    for start in range(0, len(missing), EMBED_BATCH_SIZE):
+        batch_idx = missing[start:start + EMBED_BATCH_SIZE]
+        batch = [contents[idx] for idx in batch_idx]
+        response = genai.embed_content(model=EMBED_MODEL, content=batch, task_type=task_type)
+        batch_embeddings = response.get("embedding") if isinstance(response, dict) else getattr(response, "embedding", None)
+        if not batch_embeddings or len(batch_embeddings) != len(batch):
+            raise RuntimeError("Failed to obtain embeddings from Gemini.")
+        for idx, embedding in zip(batch_idx, batch_embeddings):
+            embeddings[idx] = embedding
+            _cache_set(cache_keys[idx], embedding)
+    return embeddings
+
+
+def _empty_matrix() -> np.ndarray:
+    return np.empty((0, 0), dtype=np.float32)
+
+
+def _normalize_rows(embeddings: Any) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2 or not matrix.size:
+        return _empty_matrix()
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+
+
+def _load_context_store(mmap: bool = False) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    # Chunk text/source live in CONTEXT_STORE_PATH; embeddings are a unit-normalized float32 matrix in
+    # CONTEXT_EMBEDDINGS_PATH.
     if not CONTEXT_STORE_PATH.exists():
-        return []
+        return [], _empty_matrix()
     try:
-        with CONTEXT_STORE_PATH.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-        if isinstance(data, list):
-            return data
+        entries = orjson.loads(CONTEXT_STORE_PATH.read_bytes())
+        if not isinstance(entries, list):
+            return [], _empty_matrix()
+        if CONTEXT_EMBEDDINGS_PATH.exists():
+            embeddings = np.load(CONTEXT_EMBEDDINGS_PATH, mmap_mode="r" if mmap else None)
+            if embeddings.ndim != 2:
+                return [], _empty_matrix()
+            # Both files are swapped in separately, so tolerate a momentary row-count mismatch.
+            rows = min(len(entries), embeddings.shape[0])
+            return entries[:rows], embeddings[:rows]
     except Exception:
+        return [], _empty_matrix()
+
+    # Stores written before the split keep each embedding inline in the JSON entries.
+    kept: List[Dict[str, Any]] = []
+    rows_inline: List[Sequence[float]] = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        embedding = entry.pop("embedding", None)
+        if not isinstance(embedding, list) or not embedding:
+            continue
+        if rows_inline and len(embedding) != len(rows_inline[0]):
+            continue
+        kept.append(entry)
+        rows_inline.append(embedding)
+    if not rows_inline:
+        return [], _empty_matrix()
+    return kept, _normalize_rows(rows_inline)
+
+
+def _build_corpus(entries: List[Dict[str, Any]], embeddings: Any, normalized: bool = False) -> Dict[str, Any]:
+    # Keep embeddings as one unit-normalized float32 matrix so scoring is a single matrix-vector product.
+    matrix = np.asarray(embeddings, dtype=np.float32) if normalized else _normalize_rows(embeddings)
+    if matrix.ndim != 2 or not matrix.size or matrix.shape[0] != len(entries):
+        return {"matrix": _empty_matrix(), "index": None, "texts": [], "sources": []}
+
+    return {
+        "matrix": matrix,
+        "index": None,
+        "texts": [entry.get("text", "") for entry in entries],
+        "sources": [entry.get("source", "uploaded") for entry in entries],
+    }
+
+
+def _index_kinds(matrix: np.ndarray) -> List[str]:
+    # Preferred faiss index first, then the float fallback used if int8 fails the recall check.
+    # An empty list means the exact NumPy scan: it is fastest for small float32 corpora.
+    if faiss is None or matrix.ndim != 2 or not matrix.size:
         return []
-    return []
+    large = matrix.shape[0] >= ANN_MIN_CHUNKS
+    kinds = ["IndexHNSWFlat"] if large else []
+    if EMBEDDING_QUANTIZATION == "int8":
+        kinds.insert(0, "IndexHNSWSQ" if large else "IndexScalarQuantizer")
+    return kinds
+
+
+def _top_k_overlap(index: Any, data: np.ndarray) -> float:
+    # Probe with a spread of stored chunks and compare against the exact float32 ranking. Each probe's
+    # own row is left out of both rankings: it is a trivial top-1 hit that would inflate the recall.
+    count = data.shape[0]
+    k = min(RETRIEVAL_TOP_K, count - 1)
+    if k <= 0:
+        return 1.0
+    probe_ids = np.unique(np.linspace(0, count - 1, num=min(32, count)).astype(int))
+    probes = data[probe_ids]
+    _, approx = index.search(probes, k + 1)
+    scores = probes @ data.T
+    scores[np.arange(len(probe_ids)), probe_ids] = -np.inf
+    exact = np.argsort(-scores, axis=1)[:, :k]
+    hits = 0
+    for probe_id, found, expected in zip(probe_ids.tolist(), approx.tolist(), exact.tolist()):
+        found = [idx for idx in found if idx != probe_id][:k]
+        hits += len(set(found) & set(expected))
+    return hits / exact.size
+
+
+def _build_ann_index(matrix: np.ndarray) -> Any:
+    data = np.ascontiguousarray(matrix, dtype=np.float32)
+    # Inner product on unit vectors is cosine similarity.
+    for kind in _index_kinds(matrix):
+        if kind == "IndexHNSWFlat":
+            index = faiss.IndexHNSWFlat(data.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        elif kind == "IndexHNSWSQ":
+            index = faiss.IndexHNSWSQ(data.shape[1], faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexScalarQuantizer(data.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        index.train(data)
+        index.add(data)
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = 64
+        if kind in ("IndexHNSWSQ", "IndexScalarQuantizer") and _top_k_overlap(index, data) < QUANTIZED_MIN_RECALL:
+            continue
+        return index
+    return None
 
 
-def _save_context_store(entries: List[Dict[str, Any]]) -> None:
+def _load_ann_index(matrix: np.ndarray) -> Any:
+    kinds = _index_kinds(matrix)
+    if not kinds:
+        return None
+    if CONTEXT_INDEX_PATH.exists():
+        try:
+            index = faiss.deserialize_index(np.fromfile(CONTEXT_INDEX_PATH, dtype=np.uint8))
+            if type(index).__name__ in kinds and index.ntotal == matrix.shape[0] and index.d == matrix.shape[1]:
+                if hasattr(index, "hnsw"):
+                    index.hnsw.efSearch = 64
+                return index
+        except Exception:
+            pass
+    return _build_ann_index(matrix)
+
+
+def _store_mtime() -> Optional[Tuple[int, Optional[int]]]:
+    try:
+        meta_mtime = CONTEXT_STORE_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+    try:
+        embeddings_mtime: Optional[int] = CONTEXT_EMBEDDINGS_PATH.stat().st_mtime_ns
+    except OSError:
+        embeddings_mtime = None
+    return meta_mtime, embeddings_mtime
+
+
+def _get_corpus() -> Dict[str, Any]:
+    global _STORE_CACHE
+    mtime = _store_mtime()
+    if mtime is None:
+        return _build_corpus([], _empty_matrix())
+    cache = _STORE_CACHE
+    if cache["mtime"] != mtime:
+        # Stored embeddings are normalized at ingest time, so the memory-mapped matrix is used as-is.
+        cache = {"mtime": mtime, **_build_corpus(*_load_context_store(mmap=True), normalized=True)}
+        cache["index"] = _load_ann_index(cache["matrix"])
+        _STORE_CACHE = cache
+    return cache
+
+
+def _replace_file(path: Path, write: Any) -> None:
+    # Write next to the target and swap it in, so readers never see (or mmap) a half-written file.
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fh:
+        write(fh)
+    os.replace(tmp_path, path)
+
+
+def _save_context_store(entries: List[Dict[str, Any]], embeddings: Any) -> None:
     _ensure_store_dir()
-    with CONTEXT_STORE_PATH.open("w", encoding="utf-8") as fh:
-        json.dump(entries, fh)
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2:
+        matrix = _empty_matrix()
+    meta = [{"source": entry.get("source", "uploaded"), "text": entry.get("text", "")} for entry in entries]
+    index = _build_ann_index(matrix)
+    if index is not None:
+        _replace_file(CONTEXT_INDEX_PATH, lambda fh: fh.write(faiss.serialize_index(index).tobytes()))
+    elif CONTEXT_INDEX_PATH.exists():
+        CONTEXT_INDEX_PATH.unlink()
+    # Embeddings go first: the cache keys on both files, and a reader trims to the shorter of the two.
+    _replace_file(CONTEXT_EMBEDDINGS_PATH, lambda fh: np.save(fh, matrix))
+    _replace_file(CONTEXT_STORE_PATH, lambda fh: fh.write(orjson.dumps(meta)))
 
 
 def ingest_context_text(source_name: str, reference_text: str, api_key: Optional[str] = None) -> Dict[str, Any]:
@@ -196,17 +537,16 @@ def ingest_context_text(source_name: str, reference_text: str, api_key: Optional
         raise ValueError("Reference text could not be chunked for ingestion.")
 
     key = _get_api_key(api_key)
-    entries = _load_context_store()
+    entries, stored = _load_context_store()
 
+    embeddings = _normalize_rows(embed_texts(chunks, key, task_type="retrieval_document"))
     for chunk in chunks:
-        embedding = embed_text(chunk, key, task_type="retrieval_document")
         entries.append({
             "source": source_name,
             "text": chunk,
-            "embedding": embedding,
         })
 
-    _save_context_store(entries)
+    _save_context_store(entries, np.vstack([stored, embeddings]) if stored.size else embeddings)
     return {"added_chunks": len(chunks), "total_chunks": len(entries)}
 
 
@@ -216,28 +556,65 @@ def rebuild_context_store_from_dir(source_dir: Path = CONTEXT_SOURCE_DIR, api_ke
         return {"added_chunks": 0, "total_chunks": 0, "sources": 0}
 
     key = _get_api_key(api_key)
-    entries: List[Dict[str, Any]] = []
+    chunks: List[str] = []
+    chunk_sources: List[str] = []
     sources = 0
     for file_path in sorted(dir_path.iterdir()):
         if not file_path.is_file() or file_path.suffix.lower() not in ALLOWED_SOURCE_SUFFIXES:
             continue
-        text = _read_local_file_text(file_path)
+        text = _read_local_file_text(file_path, MAX_CONTEXT_CHARS)
         if not text.strip():
             continue
         sources += 1
         capped = text.strip()[:MAX_CONTEXT_CHARS]
         for chunk in chunk_text(capped):
-            embedding = embed_text(chunk, key, task_type="retrieval_document")
-            entries.append({
-                "source": file_path.name,
-                "text": chunk,
-                "embedding": embedding,
-            })
-
-    _save_context_store(entries)
+            chunks.append(chunk)
+            chunk_sources.append(file_path.name)
+
+    embeddings = _normalize_rows(embed_texts(chunks, key, task_type="retrieval_document"))
+    entries: List[Dict[str, Any]] = [
+        {"source": source, "text": chunk}
+        for source, chunk in zip(chunk_sources, chunks)
+    ]
+
+    _save_context_store(entries, embeddings)
     return {"added_chunks": len(entries), "total_chunks": len(entries), "sources": sources}
 
 
+def _get_ad_hoc_corpus(reference_text: str, api_key: str) -> Dict[str, Any]:
+    digest = hashlib.blake2b(reference_text.encode("utf-8"), digest_size=16).hexdigest()
+    with _AD_HOC_LOCK:
+        corpus = _AD_HOC_CACHE.get(digest)
+        if corpus is not None:
+            _AD_HOC_CACHE.move_to_end(digest)
+            return corpus
+
+    chunks = chunk_text(reference_text)
+    embeddings = _normalize_rows(embed_texts(chunks, api_key, task_type="retrieval_document"))
+    corpus = _build_corpus([{"text": chunk, "source": "ad-hoc"} for chunk in chunks], embeddings, normalized=True)
+    with _AD_HOC_LOCK:
+        _AD_HOC_CACHE[digest] = corpus
+        while len(_AD_HOC_CACHE) > AD_HOC_CACHE_SIZE:
+            _AD_HOC_CACHE.popitem(last=False)
+    return corpus
+
+
+def _rank_chunks(corpus: Dict[str, Any], query: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    matrix = corpus["matrix"]
+    k = min(top_k, matrix.shape[0])
+    index = corpus.get("index")
+    if index is not None:
+        top_scores, top_ids = index.search(query.reshape(1, -1), k)
+        return [(int(idx), float(score)) for idx, score in zip(top_ids[0], top_scores[0]) if idx >= 0]
+
+    scores = matrix @ query
+    neg_scores = -scores
+    # argpartition selects the top k in O(N); only those k are then sorted.
+    top = np.argpartition(neg_scores, k - 1)[:k] if k < scores.size else np.arange(scores.size)
+    top = top[np.argsort(neg_scores[top], kind="stable")]
+    return [(idx, float(scores[idx])) for idx in top.tolist()]
+
+
 def retrieve_relevant_context(
     problem_statement: str,
     reference_text: Optional[str] = None,
@@ -245,48 +622,40 @@ def retrieve_relevant_context(
 ) -> Optional[Dict[str, Any]]:
     key = _get_api_key(api_key)
 
+    # The query embedding does not depend on the corpus, so fetch it while the corpus is embedded or loaded.
+    query_future = _IO_POOL.submit(embed_text, problem_statement, key, "retrieval_query")
+
     # Use ad-hoc reference text if provided (backward-compatible), otherwise use stored corpus.
     if reference_text:
         capped = reference_text.strip()[:MAX_CONTEXT_CHARS]
-        chunks = chunk_text(capped)
-        corpus = [
-            {"text": chunk, "embedding": embed_text(chunk, key, task_type="retrieval_document"), "source": "ad-hoc"}
-            for chunk in chunks
-        ]
+        corpus = _get_ad_hoc_corpus(capped, key)
     else:
         if REFRESH_CONTEXT_ON_START or not CONTEXT_STORE_PATH.exists():
             rebuild_context_store_from_dir(CONTEXT_SOURCE_DIR, key)
-        corpus = _load_context_store()
-        if not corpus:
+        corpus = _get_corpus()
+        if not corpus["matrix"].size:
             rebuild_context_store_from_dir(CONTEXT_SOURCE_DIR, key)
-            corpus = _load_context_store()
+            corpus = _get_corpus()
 
-    if not corpus:
+    matrix = corpus["matrix"]
+    if not matrix.size:
+        query_future.cancel()
         return None
 
-    query_embedding = embed_text(problem_statement, key, task_type="retrieval_query")
-
-    scored: List[Tuple[float, Dict[str, Any]]] = []
-    for entry in corpus:
-        embedding = entry.get("embedding")
-        if not isinstance(embedding, list):
-            continue
-        score = cosine_similarity(query_embedding, embedding)
-        scored.append((score, entry))
-
-    if not scored:
+    query = np.asarray(query_future.result(), dtype=np.float32)
+    if query.shape != (matrix.shape[1],):
         return None
+    query /= max(float(np.linalg.norm(query)), 1e-12)
 
-    top = sorted(scored, key=lambda item: item[0], reverse=True)[:RETRIEVAL_TOP_K]
     selected_strings: List[str] = []
     display_chunks: List[Dict[str, Any]] = []
-    for rank, (score, entry) in enumerate(top, start=1):
-        chunk_text_val = entry.get("text", "")
-        source = entry.get("source", "uploaded")
+    for rank, (idx, score) in enumerate(_rank_chunks(corpus, query, RETRIEVAL_TOP_K), start=1):
+        chunk_text_val = corpus["texts"][idx]
+        source = corpus["sources"][idx]
         selected_strings.append(f"[Chunk {rank} | {source}] {chunk_text_val}")
         display_chunks.append({
             "rank": rank,
-            "score": round(float(score), 3),
+            "score": round(score, 3),
             "text": chunk_text_val,
             "source": source,
         })
@@ -298,18 +667,6 @@ def retrieve_relevant_context(
 
 
 def build_prompt(problem_statement: str, retrieved_context: Optional[Any] = None) -> str:
-    schema = {
-        "title": "Short name of the checkpoint (<= 8 words).",
-        "objective": "Student-facing goal for this step.",
-        "concept": "Key concept(s) applied here.",
-        "function_signature": "Python function signature to implement.",
-        "rules": "List of hard constraints.",
-        "expected_output": "Describe the expected behavior/output.",
-        "hints": "List of helpful hints (<= 3).",
-        "test_inputs": "Example inputs to try.",
-        "expected_outputs": "Outputs aligned to test_inputs.",
-        "validation_type": "One of: structure, correctness, integration, custom.",
-    }
     context_block = ""
     if retrieved_context:
         context_text = retrieved_context.get("joined") if isinstance(retrieved_context, dict) else str(retrieved_context)
@@ -319,28 +676,20 @@ def build_prompt(problem_statement: str, retrieved_context: Optional[Any] = None
             "Use only details present in the reference context; do not invent topics.\n"
         )
 
-    prompt = (
-        "You are an instructional designer generating programming checkpoints.\n"
-        "Return ONLY valid JSON (no prose) representing a list of checkpoint objects.\n"
-        "Each checkpoint must follow this JSON schema: " + json.dumps(schema, indent=2) + "\n"
-        + context_block +
-        "Rules:\n"
-        "- 3 to 6 checkpoints total.\n"
-        "- Keep titles concise.\n"
-        "- Provide actionable rules and hints.\n"
-        "- Prefer Pythonic, beginner-friendly guidance.\n"
-        "- If reference context exists, align objectives, concepts, and tests to it.\n"
-        "Problem statement:\n" + problem_statement.strip() + "\n"
+    return (
+        f"{_PROMPT_PREAMBLE}"
+        f"{context_block}"
+        f"{_PROMPT_RULES}"
+        f"Problem statement:\n{problem_statement.strip()}\n"
         "Respond with JSON array only.\n"
     )
-    return prompt
 
 
 def extract_json(text: str) -> Any:
     cleaned = (text or "").strip()
     if not cleaned:
         raise ValueError("Gemini response was empty; no JSON to parse.")
-    fenced = re.search(r"```json\s*(.*?)```", cleaned, re.DOTALL)
+    fenced = _FENCED_JSON_RE.search(cleaned)
     candidate = fenced.group(1) if fenced else cleaned
     candidate = candidate.strip()
     if not candidate:
@@ -352,16 +701,41 @@ def extract_json(text: str) -> Any:
         raise ValueError(f"Failed to parse Gemini JSON: {exc}; snippet: {snippet}") from exc
 
 
-def call_gemini(prompt: str, api_key: Optional[str] = None, model_name: str = DEFAULT_MODEL) -> str:
+def call_gemini(
+    prompt: str,
+    api_key: Optional[str] = None,
+    model_name: str = DEFAULT_MODEL,
+    validate: Optional[Callable[[str], Any]] = None,
+) -> str:
+    """Generate a response, reusing a cached one for the same model, config, and prompt.
+
+    ``validate`` is called on a fresh response before it is cached; if it raises, the response
+    is not cached, so a retry asks Gemini again instead of replaying the bad answer.
+    """
     key = _get_api_key(api_key)
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel(model_name, generation_config={"temperature": 0.2})
+    cache_key = _cache_key("generate", model_name, json.dumps(GENERATION_CONFIG, sort_keys=True), prompt)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    _ensure_configured(key)
+    model = _get_model(model_name)
     response = model.generate_content(prompt)
     if not response or not response.text:
         raise RuntimeError("Empty response from Gemini.")
+    if validate is not None:
+        validate(response.text)
+    _cache_set(cache_key, response.text)
     return response.text
 
 
+def _parse_checkpoints(raw_text: str) -> List[Dict[str, Any]]:
+    checkpoints = normalize_checkpoints(extract_json(raw_text))
+    if not checkpoints:
+        raise ValueError("Gemini returned no checkpoints after parsing.")
+    return checkpoints
+
+
 def generate_checkpoints(
     problem_statement: str,
     api_key: Optional[str] = None,
@@ -371,11 +745,8 @@ def generate_checkpoints(
 ) -> List[Dict[str, Any]] | Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
     retrieved_context = retrieve_relevant_context(problem_statement, reference_text, api_key)
     prompt = build_prompt(problem_statement, retrieved_context=retrieved_context)
-    raw_text = call_gemini(prompt, api_key=api_key, model_name=model_name)
-    parsed = extract_json(raw_text)
-    checkpoints = normalize_checkpoints(parsed)
-    if not checkpoints:
-        raise ValueError("Gemini returned no checkpoints after parsing.")
+    raw_text = call_gemini(prompt, api_key=api_key, model_name=model_name, validate=_parse_checkpoints)
+    checkpoints = _parse_checkpoints(raw_text)
     if return_retrieval:
         return checkpoints, retrieved_context
     return checkpoints
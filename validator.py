@@ -1,89 +1,526 @@
 import ast
+import builtins
+import hashlib
+import math
+import multiprocessing
+import operator
+import os
+import pickle
+import signal
 import sys
+import threading
+import types
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
 from io import StringIO
 import traceback
 
-def safe_execute(code, test_inputs, expected_outputs):
+import numpy as np
+
+# Builtins user code never gets; __import__ is swapped for one that refuses risky modules.
+# This trims the obvious escape hatches but is not a security boundary on its own.
+_BLOCKED_BUILTINS = frozenset({
+    'open', 'exec', 'eval', 'compile', 'input', 'breakpoint', 'help', 'exit', 'quit', '__import__'
+})
+# Modules that reach the filesystem, processes, the network or interpreter internals;
+# private modules (leading underscore) are refused as well, except __future__
+_BLOCKED_IMPORTS = frozenset({
+    'asyncio', 'builtins', 'code', 'codeop', 'concurrent', 'ctypes', 'dbm', 'faulthandler',
+    'fcntl', 'fileinput', 'ftplib', 'gc', 'glob', 'http', 'importlib', 'inspect', 'io', 'marshal',
+    'mmap', 'multiprocessing', 'nt', 'os', 'pathlib', 'pdb', 'pickle', 'pkgutil', 'platform',
+    'posix', 'pty', 'resource', 'runpy', 'select', 'selectors', 'shelve', 'shutil', 'signal',
+    'site', 'smtplib', 'socket', 'socketserver', 'sqlite3', 'ssl', 'subprocess', 'sys',
+    'sysconfig', 'tarfile', 'tempfile', 'threading', 'trace', 'types', 'urllib', 'webbrowser',
+    'xmlrpc', 'zipfile', 'zipimport'
+})
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    top_level = name.partition('.')[0]
+    blocked = top_level in _BLOCKED_IMPORTS or (top_level.startswith('_') and top_level != '__future__')
+    if level != 0 or blocked:
+        raise ImportError(f"Import of '{name}' is not allowed")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+_RESTRICTED_BUILTINS = {
+    name: value for name, value in vars(builtins).items() if name not in _BLOCKED_BUILTINS
+}
+_RESTRICTED_BUILTINS['__import__'] = _restricted_import
+
+# Everything validation needs from one parse of the user's source
+_Prepared = namedtuple('_Prepared', 'src_hash code_obj tree func_name args is_empty_body func_code')
+
+def _extract_function(tree):
     """
-    Safely execute user code with test inputs
-    Returns execution results and any errors
+    Find the first module-level function definition
+    Returns (func_name, arg_names, is_empty_body)
+    """
+    node = next((n for n in tree.body if isinstance(n, ast.FunctionDef)), None)
+    if node is None:
+        return None, (), False
+    
+    # Interned so namespace lookups and cache keys on these names compare by identity
+    args = tuple(sys.intern(arg.arg) for arg in node.args.args)
+    # Only `pass`, docstrings, or `...` in the body
+    is_empty_body = all(
+        isinstance(stmt, ast.Pass)
+        or (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant))
+        for stmt in node.body
+    )
+    return sys.intern(node.name), args, is_empty_body
+
+def _prepare(code):
+    """
+    Parse and compile user code a single time
+    Returns a _Prepared bundle; raises SyntaxError
+    """
+    return _compile_cached(_source_hash(code), code)
+
+def _source_hash(code):
+    return hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest()
+
+@lru_cache(maxsize=1024)
+def _compile_cached(src_hash, code):
+    """
+    Compile cache keyed on source hash so identical resubmissions skip parsing
+    """
+    tree = ast.parse(code, '<user>', 'exec')
+    # Compiling the tree skips a second tokenize/parse of the source
+    code_obj = compile(tree, '<user>', 'exec')
+    func_name, args, is_empty_body = _extract_function(tree)
+    return _Prepared(
+        src_hash, code_obj, tree, func_name, args, is_empty_body, _bare_function_code(tree, code_obj)
+    )
+
+def _bare_function_code(tree, code_obj):
+    """
+    Code object of the function when the module is nothing but one plain def
+    Such a function can be built directly instead of executing the module body
+    """
+    if len(tree.body) != 1 or not isinstance(tree.body[0], ast.FunctionDef):
+        return None
+    node = tree.body[0]
+    # Decorators and defaults are evaluated by the module body, so those need exec
+    if node.decorator_list or node.args.defaults or any(node.args.kw_defaults):
+        return None
+    
+    for const in code_obj.co_consts:
+        if isinstance(const, types.CodeType) and const.co_name == node.name:
+            return const
+    return None
+
+def _load_function(prepared):
+    """
+    Build the user's function in a fresh namespace
+    Returns None if the function is not defined at module level
+    """
+    func_name = prepared.func_name
+    # A copy per submission, so one learner rebinding a builtin cannot leak into the next
+    namespace = {'__builtins__': dict(_RESTRICTED_BUILTINS)}
+    if prepared.func_code is not None:
+        func = types.FunctionType(prepared.func_code, namespace, func_name)
+        # Let the function find itself (recursion) the same way exec would
+        namespace[func_name] = func
+        return func
+    
+    exec(prepared.code_obj, namespace)
+    return namespace.get(func_name)
+
+# How a test input is passed to the user's function, and the matching call for each
+_CALL_TUPLE, _CALL_DICT, _CALL_SCALAR = range(3)
+_CALLERS = (
+    lambda func, test_input: func(*test_input),
+    lambda func, test_input: func(**test_input),
+    lambda func, test_input: func(test_input),
+)
+
+def _classify(test_input):
+    if isinstance(test_input, tuple):
+        return _CALL_TUPLE
+    if isinstance(test_input, dict):
+        return _CALL_DICT
+    return _CALL_SCALAR
+
+def _build_cases(test_inputs, expected_outputs):
+    """
+    Pair each test input with its expected output and calling convention
+    """
+    return tuple(
+        (test_input, expected, _classify(test_input))
+        for test_input, expected in zip(test_inputs, expected_outputs)
+    )
+
+# Frames shown in a formatted traceback; keeps runaway recursion from walking the whole stack
+_TRACEBACK_LIMIT = 5
+
+class _LazyTB:
+    """
+    Traceback that is only formatted when something actually reads it
+    Pickles as the formatted text, since traceback objects cannot cross processes
+    """
+    __slots__ = ('exc',)
+    
+    def __init__(self, exc_info):
+        self.exc = exc_info
+    
+    def __str__(self):
+        exc_type, exc, tb = self.exc
+        # Start at the user's first frame; the validator's own frames are noise to a learner
+        user_tb = tb
+        while user_tb is not None and user_tb.tb_frame.f_code.co_filename != '<user>':
+            user_tb = user_tb.tb_next
+        summary = traceback.TracebackException(exc_type, exc, user_tb or tb, limit=_TRACEBACK_LIMIT)
+        return ''.join(summary.format())
+    
+    def __reduce__(self):
+        return (str, (str(self),))
+
+# User code runs in a pool of long-lived worker processes so a runaway submission
+# cannot hang the request thread; each worker keeps its own compile cache
+VALIDATOR_WORKERS = int(os.environ.get('VALIDATOR_WORKERS', '4'))
+DEFAULT_TIMEOUT = 2.0
+# The in-worker alarm is the time limit; the parent only kills the pool once a started
+# job has also outlived this grace period (e.g. stuck inside C code the alarm cannot interrupt)
+_TIMEOUT_GRACE = 1.0
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def _get_pool():
+    """
+    Lazily start the worker pool; returns None where processes are unavailable
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            if ctx.get_start_method() == 'forkserver':
+                # Prewarm the server so each worker starts with the validator already imported
+                ctx.set_forkserver_preload([__name__])
+            try:
+                _POOL = ProcessPoolExecutor(max_workers=VALIDATOR_WORKERS, mp_context=ctx)
+            except (OSError, NotImplementedError):
+                return None
+        return _POOL
+
+def _reset_pool(pool):
+    """
+    Kill a pool whose worker is stuck (or already died) so the next call starts a fresh one
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    # Executor has no public way to stop a running task, so terminate the workers directly.
+    # Other requests' queued jobs are left alone: they fail as BrokenProcessPool and are retried
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
+
+@contextmanager
+def _time_limit(seconds):
+    """
+    Raise TimeoutError inside the block once seconds elapse (POSIX main thread only)
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def _on_alarm(signum, frame):
+        raise TimeoutError(f'Time limit exceeded ({seconds:g}s)')
+    
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _floats_close(actual, expected):
+    try:
+        return math.isclose(actual, expected, rel_tol=1e-9)
+    except TypeError:
+        return actual == expected
+
+def _default_comparator(cases):
+    """
+    Equality test for a checkpoint's results, chosen from its expected outputs
+    """
+    expected_outputs = [expected for _, expected, _ in cases]
+    if expected_outputs and all(isinstance(expected, float) for expected in expected_outputs):
+        return _floats_close
+    if expected_outputs and all(isinstance(expected, np.ndarray) for expected in expected_outputs):
+        return np.array_equal
+    return operator.eq
+
+# Cases, comparator and worker payloads for recently seen test data, keyed by a hash of
+# (test_inputs, expected_outputs) so checkpoints reloaded from the session store still hit
+_CHECKPOINT_CACHE_SIZE = 256
+_CHECKPOINT_LOCK = threading.Lock()
+_CHECKPOINT_CACHE = OrderedDict()
+
+def _checkpoint_entry(test_inputs, expected_outputs):
+    """
+    Cached test cases, default comparator and payloads for a checkpoint's test data, LRU-bounded
+    """
+    digest = hashlib.blake2b(
+        pickle.dumps((test_inputs, expected_outputs), pickle.HIGHEST_PROTOCOL), digest_size=16
+    ).digest()
+    with _CHECKPOINT_LOCK:
+        entry = _CHECKPOINT_CACHE.get(digest)
+        if entry is not None:
+            _CHECKPOINT_CACHE.move_to_end(digest)
+            return entry
+    
+    cases = _build_cases(test_inputs, expected_outputs)
+    entry = {'cases': cases, 'compare': _default_comparator(cases), 'payloads': {}}
+    with _CHECKPOINT_LOCK:
+        _CHECKPOINT_CACHE[digest] = entry
+        while len(_CHECKPOINT_CACHE) > _CHECKPOINT_CACHE_SIZE:
+            _CHECKPOINT_CACHE.popitem(last=False)
+    return entry
+
+# Return values sent back from a worker as-is (also inside lists, tuples, sets and dicts);
+# anything else travels as its str(), so user-defined objects never cross the boundary
+_PLAIN_TYPES = frozenset({int, float, complex, bool, str, bytes, type(None)})
+_CONTAINER_TYPES = frozenset({list, tuple, set, frozenset})
+_PLAIN_DEPTH = 3
+
+def _is_plain(value, depth=_PLAIN_DEPTH):
+    value_type = type(value)
+    if value_type in _PLAIN_TYPES:
+        return True
+    if depth == 0:
+        return False
+    if value_type in _CONTAINER_TYPES:
+        return all(_is_plain(item, depth - 1) for item in value)
+    if value_type is dict:
+        return all(_is_plain(key, depth - 1) and _is_plain(item, depth - 1) for key, item in value.items())
+    return False
+
+def _portable(actual):
+    return actual if _is_plain(actual) else str(actual)
+
+def _build_results(cases, outcomes):
+    """
+    Result dicts for the tests that ran; outcomes may stop short after an early exit
     """
     results = []
+    all_passed = len(outcomes) == len(cases)
+    for (test_input, expected, _), (passed, actual) in zip(cases, outcomes):
+        if not passed:
+            all_passed = False
+        results.append({
+            'input': test_input,
+            'expected': expected,
+            'actual': actual,
+            'passed': passed
+        })
+    return {
+        'success': True,
+        'results': results,
+        'all_passed': all_passed
+    }
+
+# How the worker receives the test inputs
+_PAYLOAD_CALLS, _PAYLOAD_UNIFORM = range(2)
+
+def _checkpoint_payload(entry, max_failures, compare):
+    """
+    Pickled test inputs, expected outputs and comparator for a worker, cached on the entry
+    """
+    payload = entry['payloads'].get((max_failures, compare))
+    if payload is not None:
+        return payload
+    
+    cases = entry['cases']
+    call_kinds = {call_kind for _, _, call_kind in cases}
+    if len(call_kinds) == 1:
+        # Every test is called the same way, so the worker picks the caller once
+        inputs = (_PAYLOAD_UNIFORM, (call_kinds.pop(), tuple(test_input for test_input, _, _ in cases)))
+    else:
+        inputs = (_PAYLOAD_CALLS, tuple((test_input, call_kind) for test_input, _, call_kind in cases))
+    expected_outputs = tuple(expected for _, expected, _ in cases)
+    payload = pickle.dumps(inputs + (expected_outputs, max_failures, compare), pickle.HIGHEST_PROTOCOL)
+    entry['payloads'][(max_failures, compare)] = payload
+    return payload
+
+def _run_batch(src_hash, code, payload, options, timeout):
+    """
+    Worker entry point: load the user's function, call it on every test input and compare
+    Returns (passed, actual) per test that ran, or an error dict
+    Parse/compile results are cached per source hash inside the worker
+    """
+    mode, inputs, expected_outputs, max_failures, compare = pickle.loads(payload)
+    try:
+        with _time_limit(timeout):
+            reply = _call_all(src_hash, code, mode, inputs, expected_outputs, max_failures, compare)
+    except TimeoutError as e:
+        # The alarm can still fire after _call_all returns and before the timer is cleared;
+        # letting it escape would look like a hung worker to the parent
+        reply = {
+            'success': False,
+            'error': str(e)
+        }
+    
+    # Sending a traceback back means formatting it, so skip that when nobody will read it
+    if isinstance(reply, dict) and not options.get('traceback', True):
+        reply.pop('traceback', None)
+    return reply
+
+def _run_tests(func, calls, expected_outputs, max_failures, compare):
+    """
+    Call func for each (caller, input) in order, stopping once max_failures results are wrong
+    """
+    outcomes = []
+    failures = 0
+    for (caller, test_input), expected in zip(calls, expected_outputs):
+        actual = caller(func, test_input)
+        # Compared here so only plain data has to be sent back to the parent
+        passed = bool(compare(actual, expected))
+        outcomes.append((passed, _portable(actual)))
+        if not passed:
+            failures += 1
+            if max_failures and failures >= max_failures:
+                break
+    return outcomes
+
+def _call_all(src_hash, code, mode, inputs, expected_outputs, max_failures, compare):
+    try:
+        prepared = _compile_cached(src_hash, code)
+        func_name = prepared.func_name
+        
+        if not func_name:
+            return {
+                'success': False,
+                'error': 'No function definition found'
+            }
+        
+        # Load the user's function once in an isolated namespace
+        func = _load_function(prepared)
+        if not func:
+            return {
+                'success': False,
+                'error': f'Function {func_name} not found'
+            }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'traceback': _LazyTB(sys.exc_info())
+        }
     
-    for test_input, expected in zip(test_inputs, expected_outputs):
+    try:
+        if mode == _PAYLOAD_UNIFORM:
+            call_kind, inputs = inputs
+            caller = _CALLERS[call_kind]
+            calls = ((caller, test_input) for test_input in inputs)
+        else:
+            # Local alias so the per-test lookup is not a module global
+            callers = _CALLERS
+            calls = ((callers[call_kind], test_input) for test_input, call_kind in inputs)
+        return _run_tests(func, calls, expected_outputs, max_failures, compare)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'traceback': _LazyTB(sys.exc_info())
+        }
+
+def _submit(args, timeout):
+    """
+    Run _run_batch in the worker pool, falling back to in-process where there is no pool
+    A broken pool (another request's worker was killed) is replaced and retried once
+    The pool is only reset for a job that started and then outlived its own alarm
+    """
+    wait = timeout + _TIMEOUT_GRACE if timeout else None
+    for _ in range(2):
+        pool = _get_pool()
+        if pool is None:
+            return _run_batch(*args)
+        
         try:
-            # Create isolated namespace
-            namespace = {}
-            
-            # Execute user code
-            exec(code, namespace)
-            
-            # Extract function name from code
-            tree = ast.parse(code)
-            func_name = None
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    func_name = node.name
-                    break
-            
-            if not func_name:
-                return {
-                    'success': False,
-                    'error': 'No function definition found'
-                }
-            
-            # Call function with test input
-            func = namespace.get(func_name)
-            if not func:
-                return {
-                    'success': False,
-                    'error': f'Function {func_name} not found'
-                }
-            
-            # Execute function
-            if isinstance(test_input, tuple):
-                result = func(*test_input)
-            elif isinstance(test_input, dict):
-                result = func(**test_input)
-            else:
-                result = func(test_input)
-            
-            results.append({
-                'input': test_input,
-                'expected': expected,
-                'actual': result,
-                'passed': result == expected
-            })
-            
-        except Exception as e:
+            future = pool.submit(_run_batch, *args)
+            try:
+                return future.result(timeout=wait)
+            except FuturesTimeoutError:
+                # Still queued behind other submissions, so nothing is stuck and nothing is killed
+                if future.cancel():
+                    return {
+                        'success': False,
+                        'error': 'The validator is busy right now, please try again'
+                    }
+            # Already handed to the workers' call queue, where it can still wait out one job
+            # ahead of it before its own alarm starts, so allow two windows before giving up
+            return future.result(timeout=2 * wait if wait else None)
+        except FuturesTimeoutError:
+            _reset_pool(pool)
             return {
                 'success': False,
-                'error': str(e),
-                'traceback': traceback.format_exc()
+                'error': f'Time limit exceeded ({timeout:g}s)'
             }
+        except BrokenProcessPool:
+            _reset_pool(pool)
     
     return {
-        'success': True,
-        'results': results,
-        'all_passed': all(r['passed'] for r in results)
+        'success': False,
+        'error': 'Code execution was interrupted, please try again'
     }
 
-def validate_function_signature(code, expected_signature):
+def safe_execute(code, test_inputs, expected_outputs, prepared=None, checkpoint_data=None,
+                 include_traceback=True):
+    """
+    Safely execute user code with test inputs
+    Returns execution results and any errors
+    Tracebacks are formatted on first str(); include_traceback=False drops worker tracebacks
+    Stops after checkpoint_data['max_failures'] (default 2) failed tests unless full_report is set
+    Results are compared in the worker; 'actual' is the returned value for plain data
+    and its str() otherwise
+    checkpoint_data['comparator'] overrides the equality test; it must be a module-level
+    callable so it can be sent to a worker
+    """
+    checkpoint_data = checkpoint_data or {}
+    entry = _checkpoint_entry(test_inputs, expected_outputs)
+    cases = entry['cases']
+    max_failures = None if checkpoint_data.get('full_report') else checkpoint_data.get('max_failures', 2)
+    compare = checkpoint_data.get('comparator') or entry['compare']
+    payload = _checkpoint_payload(entry, max_failures, compare)
+    options = {'traceback': include_traceback}
+    timeout = checkpoint_data.get('timeout', DEFAULT_TIMEOUT)
+    
+    try:
+        # One round trip per submission, whatever the number of tests
+        src_hash = prepared.src_hash if prepared else _source_hash(code)
+        outcomes = _submit((src_hash, code, payload, options, timeout), timeout)
+        if isinstance(outcomes, dict):
+            return outcomes
+        
+        return _build_results(cases, outcomes)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'traceback': _LazyTB(sys.exc_info())
+        }
+
+def validate_function_signature(code, expected_signature, prepared=None):
     """
     Validate that function signature matches expected
     """
     try:
-        tree = ast.parse(code)
+        prepared = prepared or _prepare(code)
         
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                func_name = node.name
-                args = [arg.arg for arg in node.args.args]
-                return {
-                    'valid': True,
-                    'function_name': func_name,
-                    'args': args
-                }
+        if prepared.func_name:
+            return {
+                'valid': True,
+                'function_name': prepared.func_name,
+                'args': list(prepared.args)
+            }
         
         return {
             'valid': False,
@@ -96,34 +533,50 @@ def validate_function_signature(code, expected_signature):
             'error': f'Syntax error: {str(e)}'
         }
 
-def check_code_quality(code):
+def check_code_quality(code, prepared=None, syntax_error=None):
     """
     Basic code quality checks
     """
     issues = []
     
+    if prepared is None and syntax_error is None:
+        try:
+            prepared = _prepare(code)
+        except SyntaxError as e:
+            syntax_error = e
+    
     # Check for common issues
-    if 'pass' in code and code.strip().endswith('pass'):
+    if prepared is not None and prepared.is_empty_body:
         issues.append('Function body is empty (only contains pass)')
     
-    if len(code.strip()) < 10:
+    if len(code) < 10:
         issues.append('Code is too short, needs implementation')
     
     # Check syntax
-    try:
-        ast.parse(code)
-    except SyntaxError as e:
-        issues.append(f'Syntax error: {str(e)}')
+    if syntax_error is not None:
+        issues.append(f'Syntax error: {str(syntax_error)}')
     
     return issues
 
+_MAX_FAILURE_HINTS = 2
+_HINT_TMPL = "For input {inp}, expected {exp} but got {act}".format
+
 def validate_code(code, checkpoint_data):
     """
     Main validation function
     Returns detailed feedback without revealing solution
     """
+    # Parse and compile once, then share the result with every check below
+    try:
+        prepared = _prepare(code)
+        syntax_error = None
+    except SyntaxError as e:
+        # Failed parses are not cached, so hand the error on rather than parsing again
+        prepared = None
+        syntax_error = e
+    
     # Check code quality
-    quality_issues = check_code_quality(code)
+    quality_issues = check_code_quality(code, prepared, syntax_error)
     if quality_issues:
         return {
             'passed': False,
@@ -134,7 +587,8 @@ def validate_code(code, checkpoint_data):
     # Validate signature
     sig_validation = validate_function_signature(
         code, 
-        checkpoint_data.get('function_signature', '')
+        checkpoint_data.get('function_signature', ''),
+        prepared
     )
     
     if not sig_validation['valid']:
@@ -148,7 +602,10 @@ def validate_code(code, checkpoint_data):
     test_inputs = checkpoint_data.get('test_inputs', [])
     expected_outputs = checkpoint_data.get('expected_outputs', [])
     
-    exec_result = safe_execute(code, test_inputs, expected_outputs)
+    # Only the error message reaches the learner, so never pay for a traceback here
+    exec_result = safe_execute(
+        code, test_inputs, expected_outputs, prepared, checkpoint_data, include_traceback=False
+    )
     
     if not exec_result['success']:
         return {
@@ -161,14 +618,12 @@ def validate_code(code, checkpoint_data):
         }
     
     if not exec_result['all_passed']:
-        failed_tests = [r for r in exec_result['results'] if not r['passed']]
-        hints = []
-        
-        for test in failed_tests[:2]:  # Show max 2 failed tests
-            hints.append(
-                f"For input {test['input']}, expected {test['expected']} "
-                f"but got {test['actual']}"
-            )
+        # Show max 2 failed tests; stop scanning results once they are found
+        failed_tests = islice((r for r in exec_result['results'] if not r['passed']), _MAX_FAILURE_HINTS)
+        hints = [
+            _HINT_TMPL(inp=test['input'], exp=test['expected'], act=test['actual'])
+            for test in failed_tests
+        ]
         
         hints.append('Review the requirements and try different logic')
         
@@ -190,18 +645,11 @@ def execute_user_code(code, input_data):
     Used for testing purposes
     """
     try:
-        namespace = {}
-        exec(code, namespace)
-        
-        tree = ast.parse(code)
-        func_name = None
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                func_name = node.name
-                break
+        prepared = _prepare(code)
+        func = _load_function(prepared) if prepared.func_name else None
         
-        if func_name and func_name in namespace:
-            return namespace[func_name](input_data)
+        if func:
+            return func(input_data)
         
         return None
     except Exception as e: